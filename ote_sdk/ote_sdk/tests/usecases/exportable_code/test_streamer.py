@@ -2,10 +2,15 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 
+import struct
 import tempfile
+import threading
 from pathlib import Path
 from time import sleep
+from unittest.mock import patch
 
+import cv2
+import numpy as np
 import pytest
 
 from ote_sdk.tests.constants.ote_sdk_components import OteSdkComponent
@@ -20,11 +25,56 @@ from ote_sdk.usecases.exportable_code.streamer import (
     CameraStreamer,
     DirStreamer,
     ImageStreamer,
+    MultiprocessStreamer,
     OpenError,
     ThreadedStreamer,
     VideoStreamer,
     get_streamer,
 )
+from ote_sdk.usecases.exportable_code.streamer.streamer import (
+    BaseStreamer,
+    MediaType,
+    _to_rgb,
+)
+
+
+class FakeCamera:
+    """
+    Capture with queued frames that are grabbed at once, followed by fresh frames
+    that take fresh_delay seconds to grab. Time only passes on the clock of the
+    camera, perf_counter, so the grab times don't depend on the load of the machine.
+    Each frame is filled with its index.
+    """
+
+    def __init__(self, queued: int, fresh: int, fresh_delay: float = 0.05):
+        self.queued = queued
+        self.fresh = fresh
+        self.fresh_delay = fresh_delay
+        self.grabbed = 0
+        self.released = False
+        self.clock = 0.0
+
+    def perf_counter(self):
+        return self.clock
+
+    def grab(self):
+        if self.grabbed >= self.queued + self.fresh:
+            return False
+        if self.grabbed >= self.queued:
+            self.clock += self.fresh_delay
+        self.grabbed += 1
+        return True
+
+    def retrieve(self, image=None):
+        return True, np.full((4, 4, 3), self.grabbed - 1, dtype=np.uint8)
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def release(self):
+        self.released = True
 
 
 @pytest.mark.components(OteSdkComponent.OTE_SDK)
@@ -78,6 +128,182 @@ class TestStreamer:
             streamer = DirStreamer(path)
             self.assert_streamer_element(streamer)
 
+    @pytest.mark.priority_medium
+    @pytest.mark.unit
+    @pytest.mark.reqids(Requirements.REQ_1)
+    def test_dir_streamer_skips_non_image_files(self):
+        """
+        <b>Description:</b>
+        Test that DirStreamer only reads the files with an image extension
+
+        <b>Input data:</b>
+        Folder with 10 random images, a text file and a sub folder
+
+        <b>Expected results:</b>
+        Test passes if DirStreamer returns the ten images
+
+        <b>Steps</b>
+        1. Add a text file and a sub folder to a folder with images
+        2. Create DirStreamer
+        3. Request images from streamer
+        """
+        with generate_random_image_folder(height=360, width=480) as path:
+            (Path(path) / "notes.txt").write_text("not an image")
+            (Path(path) / "sub_folder.jpg").mkdir()
+            frames = list(DirStreamer(path))
+
+            assert len(frames) == 10
+            self.assert_streamer_element(frames)
+
+    @pytest.mark.priority_medium
+    @pytest.mark.unit
+    @pytest.mark.reqids(Requirements.REQ_1)
+    def test_dir_streamer_fails_on_undecodable_images(self):
+        """
+        <b>Description:</b>
+        Test that a looping DirStreamer raises an error instead of reading forever
+        when none of its images can be decoded
+
+        <b>Input data:</b>
+        Folder with PNG files that have a valid signature but broken data
+
+        <b>Expected results:</b>
+        Test passes if DirStreamer raises OpenError without returning a frame
+
+        <b>Steps</b>
+        1. Write PNG files with a valid signature and broken data
+        2. Create DirStreamer with the loop flag
+        3. Request images from streamer
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for index in range(3):
+                (Path(temp_dir) / f"broken_{index}.png").write_bytes(
+                    b"\x89PNG\r\n\x1a\n" + b"broken" * 10
+                )
+            streamer = DirStreamer(temp_dir, loop=True)
+
+            with pytest.raises(OpenError):
+                for _ in streamer:
+                    pytest.fail("A broken image was returned")
+
+    @pytest.mark.priority_medium
+    @pytest.mark.unit
+    @pytest.mark.reqids(Requirements.REQ_1)
+    def test_dir_streamer_resumes_after_last_returned_image(self):
+        """
+        <b>Description:</b>
+        Test that DirStreamer continues after the last returned image when it is
+        iterated again, although it read the next images ahead
+
+        <b>Input data:</b>
+        Folder with 10 random images
+
+        <b>Expected results:</b>
+        Test passes if the two iterations together return every image once, in order
+
+        <b>Steps</b>
+        1. Create DirStreamer and stop iterating after 3 images
+        2. Iterate the same DirStreamer again
+        3. Compare the images with the images of a single iteration
+        """
+        with generate_random_image_folder(height=360, width=480) as path:
+            expected_frames = list(DirStreamer(path))
+            streamer = DirStreamer(path, prefetch_size=4)
+            frames = []
+            for frame in streamer:
+                frames.append(frame)
+                if len(frames) == 3:
+                    break
+            frames.extend(streamer)
+
+            assert len(frames) == 10
+            for frame, expected_frame in zip(frames, expected_frames):
+                assert np.array_equal(frame, expected_frame)
+
+    @pytest.mark.priority_medium
+    @pytest.mark.unit
+    @pytest.mark.reqids(Requirements.REQ_1)
+    def test_streamers_return_rgb_frames(self):
+        """
+        <b>Description:</b>
+        Test that ImageStreamer and DirStreamer convert the BGR images read by OpenCV to RGB
+
+        <b>Input data:</b>
+        Folder with a single image filled with a known BGR color
+
+        <b>Expected results:</b>
+        Test passes if every returned frame holds the color in RGB order
+
+        <b>Steps</b>
+        1. Write an image with a BGR color to a temporary folder
+        2. Request the image from ImageStreamer and DirStreamer
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            bgr_image = np.zeros((36, 48, 3), dtype=np.uint8)
+            bgr_image[:] = (255, 128, 0)
+            image_path = str(Path(temp_dir) / "image.png")
+            cv2.imwrite(image_path, bgr_image)
+
+            for streamer in (ImageStreamer(image_path), DirStreamer(temp_dir)):
+                for frame in streamer:
+                    assert frame.shape == (36, 48, 3)
+                    assert (frame == (0, 128, 255)).all()
+
+    @pytest.mark.priority_medium
+    @pytest.mark.unit
+    @pytest.mark.reqids(Requirements.REQ_1)
+    def test_turbo_jpeg_decoding_keeps_exif_orientation(self):
+        """
+        <b>Description:</b>
+        Test that JPEG images are decoded with libjpeg-turbo unless they have an EXIF
+        orientation, which only OpenCV applies
+
+        <b>Input data:</b>
+        JPEG image without EXIF orientation and the same image rotated by EXIF
+
+        <b>Expected results:</b>
+        Test passes if the image without orientation is decoded by libjpeg-turbo and the
+        rotated image is decoded and rotated by OpenCV
+
+        <b>Steps</b>
+        1. Replace libjpeg-turbo by a fake decoder
+        2. Request both images from ImageStreamer
+        """
+
+        class FakeTurboJPEG:
+            def __init__(self):
+                self.calls = 0
+
+            def decode(self, data, pixel_format):
+                self.calls += 1
+                return np.full((36, 48, 3), 7, dtype=np.uint8)
+
+        _, jpeg = cv2.imencode(".jpg", np.zeros((36, 48, 3), dtype=np.uint8))
+        jpeg = jpeg.tobytes()
+        # Little endian TIFF header with a single orientation tag, rotated by 90 degrees
+        tiff = b"II*\0" + struct.pack("<IHHHIHHI", 8, 1, 0x0112, 3, 1, 6, 0, 0)
+        exif = b"Exif\0\0" + tiff
+        rotated_jpeg = (
+            jpeg[:2] + b"\xff\xe1" + struct.pack(">H", len(exif) + 2) + exif + jpeg[2:]
+        )
+        turbo_jpeg = FakeTurboJPEG()
+        decoder_module = "ote_sdk.usecases.exportable_code.streamer.image_decoder"
+        with tempfile.TemporaryDirectory() as temp_dir, patch(
+            f"{decoder_module}._get_turbo_jpeg", return_value=turbo_jpeg
+        ), patch(f"{decoder_module}.TJPF_RGB", 0, create=True):
+            image_path = Path(temp_dir) / "image.jpg"
+            image_path.write_bytes(jpeg)
+            rotated_image_path = Path(temp_dir) / "rotated_image.jpg"
+            rotated_image_path.write_bytes(rotated_jpeg)
+
+            frame = next(iter(ImageStreamer(str(image_path))))
+            assert turbo_jpeg.calls == 1
+            assert (frame == 7).all()
+
+            frame = next(iter(ImageStreamer(str(rotated_image_path))))
+            assert turbo_jpeg.calls == 1
+            assert frame.shape == (48, 36, 3)
+
     @pytest.mark.priority_medium
     @pytest.mark.unit
     @pytest.mark.reqids(Requirements.REQ_1)
@@ -129,6 +355,147 @@ class TestStreamer:
                 if index > 200:
                     break
 
+    @pytest.mark.priority_medium
+    @pytest.mark.unit
+    @pytest.mark.reqids(Requirements.REQ_1)
+    def test_video_streamer_with_frame_pool(self):
+        """
+        <b>Description:</b>
+        Test that VideoStreamer decodes frames into a ring of reused buffers
+
+        <b>Input data:</b>
+        Random Video file
+
+        <b>Expected results:</b>
+        Test passes if VideoStreamer returns frames with the correct size and
+        reuses a buffer after pool_size frames
+
+        <b>Steps</b>
+        1. Create VideoStreamer with a frame pool of 3 buffers
+        2. Request frames from streamer
+        """
+        with generate_random_single_video(
+            height=360, width=480, number_of_frames=10
+        ) as path:
+            streamer = VideoStreamer(path, pool_size=3)
+            frames = list(streamer)
+
+            assert len(frames) == 10
+            self.assert_streamer_element(frames)
+            assert np.shares_memory(frames[0], frames[3])
+            assert not np.shares_memory(frames[0], frames[1])
+
+    @pytest.mark.priority_medium
+    @pytest.mark.unit
+    @pytest.mark.reqids(Requirements.REQ_1)
+    def test_threaded_video_streamer_with_frame_pool(self):
+        """
+        <b>Description:</b>
+        Test that a frame pool of buffer_size + 1 buffers is large enough for a
+        ThreadedStreamer with a slow consumer
+
+        <b>Input data:</b>
+        Random Video file
+
+        <b>Expected results:</b>
+        Test passes if every frame still matches the frame read without a pool after
+        the consumer processed it
+
+        <b>Steps</b>
+        1. Read the frames of the video without a pool
+        2. Create ThreadedStreamer for a VideoStreamer with a pool of buffer_size + 1
+        3. Retrieve frames slowly and compare them with the frames read without a pool
+        """
+        buffer_size = 8
+        with generate_random_single_video(
+            height=36, width=48, number_of_frames=40
+        ) as path:
+            expected_frames = list(VideoStreamer(path))
+            streamer = ThreadedStreamer(
+                VideoStreamer(path, pool_size=buffer_size + 1), buffer_size=buffer_size
+            )
+
+            number_of_frames = 0
+            for frame, expected_frame in zip(streamer, expected_frames):
+                sleep(0.002)
+                assert np.array_equal(frame, expected_frame)
+                number_of_frames += 1
+            assert number_of_frames == 40
+
+    @pytest.mark.priority_medium
+    @pytest.mark.unit
+    @pytest.mark.reqids(Requirements.REQ_1)
+    def test_streamers_with_umat_frames(self):
+        """
+        <b>Description:</b>
+        Test that the streamers return cv2.UMat frames when use_umat is set
+
+        <b>Input data:</b>
+        Random Video file
+        Folder with 10 random images
+
+        <b>Expected results:</b>
+        Test passes if VideoStreamer and DirStreamer return UMat frames with the
+        correct size
+
+        <b>Steps</b>
+        1. Create VideoStreamer and DirStreamer with use_umat
+        2. Request frames from the streamers
+        """
+        with generate_random_single_video(
+            height=360, width=480, number_of_frames=10
+        ) as video_path, generate_random_image_folder(height=360, width=480) as path:
+            for streamer in (
+                VideoStreamer(video_path, use_umat=True),
+                DirStreamer(path, use_umat=True),
+            ):
+                frames = list(streamer)
+
+                assert len(frames) == 10
+                assert all(isinstance(frame, cv2.UMat) for frame in frames)
+                self.assert_streamer_element(frame.get() for frame in frames)
+
+    @pytest.mark.priority_medium
+    @pytest.mark.unit
+    @pytest.mark.reqids(Requirements.REQ_1)
+    def test_to_rgb_frame_conversion(self):
+        """
+        <b>Description:</b>
+        Test that the streamers convert BGR and BGRA frames and leave single channel
+        frames unchanged
+
+        <b>Input data:</b>
+        Grayscale, BGR and BGRA frames
+
+        <b>Expected results:</b>
+        Test passes if the grayscale frame is returned unchanged, the BGR frame becomes
+        RGB and the BGRA frame becomes RGBA with the alpha channel kept, with and
+        without cv2.UMat
+
+        <b>Steps</b>
+        1. Convert a grayscale, a BGR and a BGRA frame
+        2. Convert the same frames with use_umat set
+        """
+        gray_frame = np.full((36, 48), 7, dtype=np.uint8)
+        assert _to_rgb(gray_frame) is gray_frame
+        umat_frame = _to_rgb(gray_frame, use_umat=True)
+        assert isinstance(umat_frame, cv2.UMat)
+        assert np.array_equal(umat_frame.get(), gray_frame)
+
+        for bgr_color, rgb_color in (
+            ((255, 128, 0), (0, 128, 255)),
+            ((255, 128, 0, 64), (0, 128, 255, 64)),
+        ):
+            for use_umat in (False, True):
+                bgr_frame = np.zeros((36, 48, len(bgr_color)), dtype=np.uint8)
+                bgr_frame[:] = bgr_color
+                frame = _to_rgb(bgr_frame, use_umat=use_umat)
+                if use_umat:
+                    assert isinstance(frame, cv2.UMat)
+                    frame = frame.get()
+                assert frame.shape == (36, 48, len(rgb_color))
+                assert (frame == rgb_color).all()
+
     @pytest.mark.priority_medium
     @pytest.mark.unit
     @pytest.mark.reqids(Requirements.REQ_1)
@@ -288,6 +655,50 @@ class TestStreamer:
             if n == 0:
                 break
 
+    @pytest.mark.priority_medium
+    @pytest.mark.unit
+    @pytest.mark.reqids(Requirements.REQ_1)
+    def test_camera_streamer_drops_stale_frames(self):
+        """
+        <b>Description:</b>
+        Check that CameraStreamer with drop_stale returns the latest frame of the camera
+
+        <b>Input data:</b>
+        Fake camera with queued frames that are grabbed at once, followed by fresh
+        frames that take a frame interval to grab
+
+        <b>Expected results:</b>
+        Test passes if CameraStreamer skips the queued frames, grabs at most 30 stale
+        frames per returned frame and stops when a grab fails
+
+        <b>Steps</b>
+        1. Create CameraStreamer with drop_stale and replace its capture and clock by
+           a fake camera
+        2. Retrieve frames with 5 queued frames and 3 fresh frames
+        3. Retrieve frames with 100 queued frames
+        """
+
+        def read_frames(camera):
+            streamer = CameraStreamer(drop_stale=True)
+            streamer.stream.release()
+            streamer.stream = camera
+            streamer._fresh_grab_time = 0.01  # pylint: disable=protected-access
+            with patch(
+                "ote_sdk.usecases.exportable_code.streamer.streamer.time"
+            ) as time_mock:
+                time_mock.perf_counter = camera.perf_counter
+                return [frame[0, 0, 0] for frame in streamer]
+
+        camera = FakeCamera(queued=5, fresh=3)
+        # The first grab that waits for the camera marks the latest frame
+        assert read_frames(camera) == [5, 6, 7]
+        assert camera.released
+
+        camera = FakeCamera(queued=100, fresh=0)
+        # Without a grab that waits, every 30 grabs return a frame
+        assert read_frames(camera) == [29, 59, 89]
+        assert camera.released
+
     @pytest.mark.priority_medium
     @pytest.mark.unit
     @pytest.mark.reqids(Requirements.REQ_1)
@@ -351,3 +762,207 @@ class TestStreamer:
                     break
 
             assert frame_count == 5
+
+    @pytest.mark.priority_medium
+    @pytest.mark.unit
+    @pytest.mark.reqids(Requirements.REQ_1)
+    def test_threaded_streamer_stops_at_end_of_stream(self):
+        """
+        <b>Description:</b>
+        Check that ThreadedStreamer returns every frame and stops at the end of the stream
+
+        <b>Input data:</b>
+        Folder with 10 images
+
+        <b>Expected results:</b>
+        Test passes if ThreadedStreamer returns 10 frames and then stops
+
+        <b>Steps</b>
+        1. Create ThreadedStreamer with a buffer smaller than the number of images
+        2. Retrieve all frames from ThreadedStreamer
+        """
+        with generate_random_image_folder(height=360, width=480) as path:
+            streamer = ThreadedStreamer(DirStreamer(path), buffer_size=4)
+            frames = list(streamer)
+
+            assert len(frames) == 10
+            self.assert_streamer_element(frames)
+
+    @pytest.mark.priority_medium
+    @pytest.mark.unit
+    @pytest.mark.reqids(Requirements.REQ_1)
+    def test_threaded_streamer_raises_streamer_error(self):
+        """
+        <b>Description:</b>
+        Check that ThreadedStreamer passes on the error raised by the wrapped streamer
+
+        <b>Input data:</b>
+        Streamer that raises an error after two frames
+
+        <b>Expected results:</b>
+        Test passes if ThreadedStreamer returns two frames and then raises the error
+
+        <b>Steps</b>
+        1. Create ThreadedStreamer for a streamer that fails after two frames
+        2. Retrieve frames from ThreadedStreamer
+        """
+
+        class FailingStreamer(BaseStreamer):
+            def __iter__(self):
+                yield np.zeros((360, 480, 3), dtype=np.uint8)
+                yield np.zeros((360, 480, 3), dtype=np.uint8)
+                raise OpenError("Can't read the next frame")
+
+            def get_type(self):
+                return MediaType.VIDEO
+
+        frames = []
+        with pytest.raises(OpenError):
+            for frame in ThreadedStreamer(FailingStreamer()):
+                frames.append(frame)
+
+        assert len(frames) == 2
+
+    @pytest.mark.priority_medium
+    @pytest.mark.unit
+    @pytest.mark.reqids(Requirements.REQ_1)
+    def test_threaded_streamer_with_slow_producer(self):
+        """
+        <b>Description:</b>
+        Check that ThreadedStreamer delivers buffered frames without waiting for the
+        next frame of a slow producer
+
+        <b>Input data:</b>
+        Streamer that only produces its third frame after the consumer received the
+        second one
+
+        <b>Expected results:</b>
+        Test passes if the second frame, buffered while the consumer was busy, is
+        delivered before the producer makes the third frame
+
+        <b>Steps</b>
+        1. Create ThreadedStreamer for the slow streamer
+        2. Keep the consumer busy on the first frame so the second one is buffered
+        3. Retrieve the second frame and release the producer
+        """
+        next_frame_allowed = threading.Event()
+        producer_waits = []
+
+        class SlowStreamer(BaseStreamer):
+            def __iter__(self):
+                yield np.zeros((4, 4, 3), dtype=np.uint8)
+                yield np.ones((4, 4, 3), dtype=np.uint8)
+                # Times out if the second frame is held back until the third one
+                producer_waits.append(next_frame_allowed.wait(timeout=1.0))
+                yield np.full((4, 4, 3), 2, dtype=np.uint8)
+
+            def get_type(self):
+                return MediaType.VIDEO
+
+        streamer = ThreadedStreamer(SlowStreamer(), buffer_size=8)
+        for index, frame in enumerate(streamer):
+            assert (frame == index).all()
+            if index == 0:
+                sleep(0.1)
+            elif index == 1:
+                next_frame_allowed.set()
+
+        assert producer_waits == [True]
+
+    @pytest.mark.priority_medium
+    @pytest.mark.unit
+    @pytest.mark.reqids(Requirements.REQ_1)
+    def test_threaded_streamer_bounds_read_ahead(self):
+        """
+        <b>Description:</b>
+        Check that ThreadedStreamer reads at most buffer_size frames ahead of a slow consumer
+
+        <b>Input data:</b>
+        Streamer that counts the frames it produced
+
+        <b>Expected results:</b>
+        Test passes if the streamer never produced more than buffer_size frames that the
+        consumer did not receive yet
+
+        <b>Steps</b>
+        1. Create ThreadedStreamer for a counting streamer
+        2. Retrieve frames slowly and compare the produced and consumed frame counts
+        """
+        buffer_size = 16
+        produced = []
+
+        class CountingStreamer(BaseStreamer):
+            def __iter__(self):
+                for index in range(100):
+                    produced.append(index)
+                    yield np.full((4, 4, 3), index % 256, dtype=np.uint8)
+
+            def get_type(self):
+                return MediaType.VIDEO
+
+        read_ahead = 0
+        for consumed, _ in enumerate(
+            ThreadedStreamer(CountingStreamer(), buffer_size=buffer_size), 1
+        ):
+            sleep(0.002)
+            read_ahead = max(read_ahead, len(produced) - consumed)
+
+        assert len(produced) == 100
+        assert buffer_size // 2 <= read_ahead <= buffer_size
+
+    @pytest.mark.priority_medium
+    @pytest.mark.unit
+    @pytest.mark.reqids(Requirements.REQ_1)
+    def test_multiprocess_streamer(self):
+        """
+        <b>Description:</b>
+        Check that MultiprocessStreamer returns the frames of the streamer it runs
+
+        <b>Input data:</b>
+        Folder with 10 images
+
+        <b>Expected results:</b>
+        Test passes if MultiprocessStreamer returns the 10 images in order
+
+        <b>Steps</b>
+        1. Create MultiprocessStreamer with fewer slots than images
+        2. Retrieve all frames from MultiprocessStreamer
+        3. Compare them with the frames of the DirStreamer
+        """
+        with generate_random_image_folder(height=360, width=480) as path:
+            expected_frames = list(DirStreamer(path))
+            frames = list(MultiprocessStreamer(DirStreamer(path), buffer_size=3))
+
+            assert len(frames) == 10
+            for frame, expected_frame in zip(frames, expected_frames):
+                assert np.array_equal(frame, expected_frame)
+
+    @pytest.mark.priority_medium
+    @pytest.mark.unit
+    @pytest.mark.reqids(Requirements.REQ_1)
+    def test_multiprocess_streamer_with_umat_frames(self):
+        """
+        <b>Description:</b>
+        Check that MultiprocessStreamer returns the cv2.UMat frames of the streamer it
+        runs as numpy arrays
+
+        <b>Input data:</b>
+        Folder with 10 images
+
+        <b>Expected results:</b>
+        Test passes if MultiprocessStreamer returns the 10 images as numpy arrays
+
+        <b>Steps</b>
+        1. Create MultiprocessStreamer for a DirStreamer that returns cv2.UMat frames
+        2. Retrieve all frames from MultiprocessStreamer
+        3. Compare them with the frames of the DirStreamer
+        """
+        with generate_random_image_folder(height=360, width=480) as path:
+            expected_frames = list(DirStreamer(path))
+            streamer = MultiprocessStreamer(DirStreamer(path, use_umat=True))
+            frames = list(streamer)
+
+            assert len(frames) == 10
+            for frame, expected_frame in zip(frames, expected_frames):
+                assert isinstance(frame, np.ndarray)
+                assert np.array_equal(frame, expected_frame)
@@ -5,6 +5,9 @@ Initialization of streamer
 # SPDX-License-Identifier: Apache-2.0
 #
 
+from ote_sdk.usecases.exportable_code.streamer.multiprocess_streamer import (
+    MultiprocessStreamer,
+)
 from ote_sdk.usecases.exportable_code.streamer.streamer import (
     CameraStreamer,
     DirStreamer,
@@ -21,6 +24,7 @@ __all__ = [
     "DirStreamer",
     "ImageStreamer",
     "ThreadedStreamer",
+    "MultiprocessStreamer",
     "VideoStreamer",
     "InvalidInput",
     "OpenError",
@@ -0,0 +1,208 @@
+"""
+Image file decoding for the image streamers
+"""
+
+# Copyright (C) 2021-2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+#
+
+import functools
+import logging
+import struct
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+import cv2
+import numpy as np
+
+try:
+    from turbojpeg import TJPF_RGB, TurboJPEG
+except ImportError:
+    TurboJPEG = None
+
+logger = logging.getLogger(__name__)
+
+# Only available in OpenCV 4.10 and newer
+_IMREAD_COLOR_RGB: Optional[int] = getattr(cv2, "IMREAD_COLOR_RGB", None)
+_JPEG_EXTENSIONS = (".jpg", ".jpeg")
+# Image formats cv2.imread can decode
+IMAGE_EXTENSIONS = _JPEG_EXTENSIONS + (
+    ".bmp",
+    ".dib",
+    ".jpe",
+    ".jp2",
+    ".png",
+    ".webp",
+    ".pbm",
+    ".pgm",
+    ".ppm",
+    ".pxm",
+    ".pnm",
+    ".sr",
+    ".ras",
+    ".tiff",
+    ".tif",
+    ".exr",
+    ".hdr",
+    ".pic",
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_turbo_jpeg() -> Optional["TurboJPEG"]:
+    """
+    Get the TurboJPEG decoder, if PyTurboJPEG and libjpeg-turbo are installed.
+    """
+    if TurboJPEG is None:
+        return None
+    try:
+        return TurboJPEG()
+    except (OSError, RuntimeError) as error:
+        logger.debug("libjpeg-turbo is not available: %s", error)
+        return None
+
+
+def read_file(filename: str) -> Optional[np.ndarray]:
+    """
+    Read the raw bytes of a file.
+
+    :param filename: Path to the file
+    :return: The bytes of the file, or None if the file can't be read
+    """
+    try:
+        return np.fromfile(filename, dtype=np.uint8)
+    except OSError:
+        return None
+
+
+def _imdecode_rgb(data: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Decode an encoded image with OpenCV and convert it to RGB.
+
+    OpenCV 4.10 and newer decode to RGB directly.
+
+    :param data: The bytes of the image file
+    :return: The RGB image, or None if the data can't be decoded
+    """
+    if data.size == 0:
+        return None
+    if _IMREAD_COLOR_RGB is not None:
+        return cv2.imdecode(data, _IMREAD_COLOR_RGB)
+    image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if image is not None:
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+    return image
+
+
+def _exif_orientation(data: np.ndarray) -> int:
+    """
+    Get the EXIF orientation of a JPEG image.
+
+    Only the segments before the compressed image data are parsed, so this is cheap
+    compared to decoding.
+
+    :param data: The bytes of the JPEG file
+    :return: The orientation, 1 if the image has no orientation tag
+    """
+    view = data.data
+    # Skip the start of image marker
+    offset = 2
+    try:
+        while True:
+            marker, length = struct.unpack_from(">HH", view, offset)
+            # Start of scan, the compressed image data follows
+            if marker == 0xFFDA or marker >> 8 != 0xFF:
+                return 1
+            if (
+                marker == 0xFFE1
+                and bytes(view[offset + 4 : offset + 10]) == b"Exif\0\0"
+            ):
+                return _tiff_orientation(view, offset + 10)
+            offset += 2 + length
+    except struct.error:
+        return 1
+
+
+def _tiff_orientation(view: memoryview, tiff_offset: int) -> int:
+    """
+    Get the orientation tag of the first image file directory of an EXIF block.
+
+    :param view: The bytes of the JPEG file
+    :param tiff_offset: Offset of the TIFF header of the EXIF block
+    :return: The orientation, 1 if the directory has no orientation tag
+    """
+    byte_order = bytes(view[tiff_offset : tiff_offset + 2])
+    if byte_order not in (b"II", b"MM"):
+        return 1
+    endian = "<" if byte_order == b"II" else ">"
+    ifd_offset = (
+        tiff_offset + struct.unpack_from(endian + "I", view, tiff_offset + 4)[0]
+    )
+    (num_entries,) = struct.unpack_from(endian + "H", view, ifd_offset)
+    for entry in range(ifd_offset + 2, ifd_offset + 2 + 12 * num_entries, 12):
+        tag, _, _, value = struct.unpack_from(endian + "HHIH", view, entry)
+        if tag == 0x0112:
+            return value
+    return 1
+
+
+def _turbo_jpeg_decode_rgb(data: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Decode a JPEG image straight to RGB with libjpeg-turbo.
+
+    This fuses decoding and color conversion. libjpeg-turbo does not apply the EXIF
+    orientation, so rotated or flipped images are decoded with OpenCV, like the data
+    libjpeg-turbo fails to decode.
+
+    :param data: The bytes of the JPEG file
+    :return: The RGB image, or None if the data can't be decoded
+    """
+    turbo_jpeg = _get_turbo_jpeg()
+    if turbo_jpeg is not None and _exif_orientation(data) == 1:
+        try:
+            return turbo_jpeg.decode(data, pixel_format=TJPF_RGB)
+        except OSError:
+            pass
+    return _imdecode_rgb(data)
+
+
+def get_image_decoder(filename: str) -> Callable[[np.ndarray], Optional[np.ndarray]]:
+    """
+    Get the function that decodes the image file to RGB.
+
+    :param filename: Path to the image file
+    :return: libjpeg-turbo for JPEG files if it is available, OpenCV otherwise
+    """
+    if filename.lower().endswith(_JPEG_EXTENSIONS) and _get_turbo_jpeg() is not None:
+        return _turbo_jpeg_decode_rgb
+    return _imdecode_rgb
+
+
+def decode_file(
+    decoder: Callable[[np.ndarray], Optional[np.ndarray]],
+    data: "Future[Optional[np.ndarray]]",
+) -> Optional[np.ndarray]:
+    """
+    Decode a file once it has been read.
+
+    :param decoder: The function that decodes the file
+    :param data: The pending read of the file
+    :return: The RGB image, or None if the file can't be read or decoded
+    """
+    file_data = data.result()
+    if file_data is None:
+        return None
+    return decoder(file_data)
+
+
+def read_rgb_image(filename: str) -> Optional[np.ndarray]:
+    """
+    Read an image file as RGB with the decoder that fits the file.
+
+    :param filename: Path to the image file
+    :return: The RGB image, or None if the file can't be read
+    """
+    data = read_file(filename)
+    if data is None:
+        return None
+    return get_image_decoder(filename)(data)
@@ -0,0 +1,218 @@
+"""
+Streamer that reads frames in a separate process
+"""
+
+# Copyright (C) 2021-2022 Intel Corporation
+# SPDX-License-Identifier: Apache-2.0
+#
+
+import multiprocessing
+import os
+import queue
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Iterator, Optional
+
+import cv2
+import numpy as np
+
+from ote_sdk.usecases.exportable_code.streamer.streamer import (
+    BaseStreamer,
+    MediaType,
+    OpenError,
+)
+
+
+def _shared_memory_run(
+    streamer: BaseStreamer,
+    messages: multiprocessing.Queue,
+    free_slots: multiprocessing.Queue,
+) -> None:
+    """
+    Private function that is run by the process of a MultiprocessStreamer.
+
+    The first frame is sent through the queue so that the consumer can size the
+    shared memory slots. Every other frame is copied to a free slot and only the
+    slot name, shape and dtype are sent. Frames that don't fit in a slot are sent
+    through the queue as well. The stream ends with an "end" message that carries
+    the error that ended it, if any.
+
+    cv2.UMat frames are downloaded to numpy arrays first. Any other frame type is
+    rejected here: the queue pickles in a background thread that swallows errors,
+    so an unpicklable frame would never reach the consumer.
+
+    :param streamer: The streamer to retrieve frames from
+    :param messages: The queue to send the frames or their slots through
+    :param free_slots: The queue the consumer returns the names of free slots with
+    """
+    attached: Dict[str, shared_memory.SharedMemory] = {}
+    error: Optional[Exception] = None
+    consumer_exited = False
+    try:
+        for frame_id, frame in enumerate(streamer):
+            if isinstance(frame, cv2.UMat):
+                frame = frame.get()
+            if not isinstance(frame, np.ndarray):
+                raise TypeError(
+                    f"Can't send a frame of type {type(frame).__name__} between processes"
+                )
+            if frame_id == 0:
+                messages.put(("frame", frame))
+                continue
+            name = _wait_free_slot(free_slots)
+            if name is None:
+                consumer_exited = True
+                break
+            if name not in attached:
+                attached[name] = shared_memory.SharedMemory(name=name)
+            slot = attached[name]
+            if frame.nbytes > slot.size:
+                free_slots.put(name)
+                messages.put(("frame", frame))
+                continue
+            np.ndarray(frame.shape, frame.dtype, buffer=slot.buf)[...] = frame
+            messages.put(("slot", name, frame.shape, frame.dtype.str))
+    except Exception as streamer_error:  # pylint: disable=broad-except
+        error = streamer_error
+    finally:
+        # Nobody reads the messages once the consumer exited, so a put could block
+        if not consumer_exited:
+            messages.put(("end", error))
+        for slot in attached.values():
+            slot.close()
+
+
+def _wait_free_slot(free_slots: multiprocessing.Queue) -> Optional[str]:
+    """
+    Wait until the consumer returns a free shared memory slot.
+
+    Only checks whether the consumer process is still alive after a second without
+    a free slot, so that the process does not wait forever for a consumer that
+    crashed.
+
+    :param free_slots: The queue the consumer returns the names of free slots with
+    :return: The name of the slot, or None if the consumer process exited
+    """
+    parent = multiprocessing.parent_process()
+    while True:
+        try:
+            return free_slots.get(timeout=1.0)
+        except queue.Empty:
+            if parent is not None and not parent.is_alive():
+                return None
+
+
+class MultiprocessStreamer(BaseStreamer):
+    """
+    Runs a BaseStreamer in a separate process.
+
+    Use this instead of ThreadedStreamer when the streamer does Python-heavy work
+    that holds the GIL. The frames are passed through a ring of shared memory
+    slots, sized after the first frame, so only the slot name crosses the process
+    boundary instead of the pickled frame. The consumer receives a copy of the
+    slot, so it can keep frames for as long as it needs.
+
+    The streamer is sent to the new process, so it has to be picklable when
+    multiprocessing uses the spawn start method. cv2.UMat frames can't be shared
+    between processes, so they are returned as numpy arrays.
+
+    :param streamer: The streamer to run in a process
+    :param buffer_size: Number of shared memory slots to buffer frames in
+
+    :example:
+
+        >>> streamer = DirStreamer(path="../images")
+        >>> multiprocess_streamer = MultiprocessStreamer(streamer)
+        ... for frame in multiprocess_streamer:
+        ...    pass
+    """
+
+    def __init__(self, streamer: BaseStreamer, buffer_size: int = 16) -> None:
+        self.buffer_size = buffer_size
+        self.streamer = streamer
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        messages: multiprocessing.Queue = multiprocessing.Queue(
+            maxsize=self.buffer_size
+        )
+        free_slots: multiprocessing.Queue = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=_shared_memory_run, args=(self.streamer, messages, free_slots)
+        )
+        # Make the process a daemon so that it will exit when the main program exits
+        process.daemon = True
+        if os.name == "posix":
+            # Share the resource tracker with the process, so the slots it attaches to
+            # are not reported as leaked and unlinked a second time when it exits
+            resource_tracker.ensure_running()
+        process.start()
+
+        slots: Dict[str, shared_memory.SharedMemory] = {}
+        try:
+            while True:
+                message = self._next_message(messages, process)
+                if message[0] == "end":
+                    if message[1] is not None:
+                        raise message[1]
+                    break
+                if message[0] == "frame":
+                    frame = message[1]
+                    if not slots:
+                        slots = self._create_slots(max(1, frame.nbytes))
+                        for name in slots:
+                            free_slots.put(name)
+                    yield frame
+                else:
+                    _, name, shape, dtype = message
+                    frame = np.ndarray(shape, dtype, buffer=slots[name].buf).copy()
+                    free_slots.put(name)
+                    yield frame
+        finally:
+            process.terminate()
+            process.join()
+            for slot in slots.values():
+                slot.close()
+                slot.unlink()
+
+    @staticmethod
+    def _next_message(
+        messages: multiprocessing.Queue, process: multiprocessing.Process
+    ) -> tuple:
+        """
+        Wait for the next message of the process.
+
+        Only checks whether the process is still alive after a second without
+        messages, so that a crashed process does not block the consumer forever.
+
+        :param messages: The queue the process sends its messages through
+        :param process: The process running the streamer
+        :return: The message
+        """
+        while True:
+            try:
+                return messages.get(timeout=1.0)
+            except queue.Empty:
+                if not process.is_alive():
+                    try:
+                        return messages.get_nowait()
+                    except queue.Empty:
+                        error = OpenError("The streamer process exited unexpectedly")
+                        return ("end", error)
+
+    def _create_slots(self, slot_size: int) -> Dict[str, shared_memory.SharedMemory]:
+        """
+        Create the shared memory slots.
+
+        :param slot_size: Size of a slot in bytes
+        :return: The slots by name
+        """
+        slots = {}
+        for _ in range(self.buffer_size):
+            slot = shared_memory.SharedMemory(create=True, size=slot_size)
+            slots[slot.name] = slot
+        return slots
+
+    def get_type(self) -> MediaType:
+        """
+        Get type of internal streamer
+        """
+        return self.streamer.get_type()
@@ -7,16 +7,57 @@ Streamer for reading input
 #
 
 import abc
-import multiprocessing
+import functools
+import itertools
+import logging
 import os
-import queue
 import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from enum import Enum
-from typing import Iterator, Union
+from typing import Callable, Deque, Iterator, List, Optional, Tuple, Union
 
 import cv2
 import numpy as np
 
+from ote_sdk.usecases.exportable_code.streamer.image_decoder import (
+    IMAGE_EXTENSIONS,
+    decode_file,
+    get_image_decoder,
+    read_file,
+    read_rgb_image,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def _log_opencv_build() -> None:
+    """
+    Log the OpenCV build flags that decide the speed of the streamers, once.
+
+    The BGR to RGB conversion done by the streamers is memory bound and only gets the
+    wide-intrinsics speed up if OpenCV is built with CV_ENABLE_INTRINSICS=ON and a
+    parallel framework (TBB, OpenMP or pthreads). The relevant build flags are logged
+    so that a slow scalar build can be spotted. The optimization and thread settings
+    are process-wide, so they are left to the application. This runs when the first
+    streamer is created rather than at import, once the application has configured
+    logging.
+    """
+    build_flags = [
+        " ".join(line.split())
+        for line in cv2.getBuildInformation().splitlines()
+        if line.strip().startswith(
+            ("Baseline:", "Dispatched code generation:", "Parallel framework:")
+        )
+    ]
+    logger.debug("OpenCV optimized code: %s", cv2.useOptimized())
+    logger.debug("OpenCV threads: %s", cv2.getNumThreads())
+    for flag in build_flags:
+        logger.debug("OpenCV %s", flag)
+
 
 class InvalidInput(Exception):
     """
@@ -52,10 +93,14 @@ class MediaType(Enum):
 class BaseStreamer(metaclass=abc.ABCMeta):
     """
     Base Streamer interface to implement Image, Video and Camera streamers.
+
+    Streamers with a use_umat option can return cv2.UMat frames, so the color
+    conversion and the transforms applied downstream run through OpenCV's T-API,
+    on OpenCL devices where available. Call get() on a frame to get a numpy array.
     """
 
     @abc.abstractmethod
-    def __iter__(self) -> Iterator[np.ndarray]:
+    def __iter__(self) -> Iterator[Union[np.ndarray, cv2.UMat]]:
         """
         Iterate through the streamer object that is a Python Generator object.
         :return: Yield the image or video frame.
@@ -70,24 +115,133 @@ class BaseStreamer(metaclass=abc.ABCMeta):
         raise NotImplementedError
 
 
-def _process_run(streamer: BaseStreamer, buffer: multiprocessing.Queue) -> None:
+class _PingPongBuffer:
+    """
+    Double buffer that passes frames from a producer thread to a consumer.
+
+    The producer appends frames to the write segment while the consumer reads the
+    segment it took last. When the consumer has read its segment it takes every
+    frame buffered so far at once, so buffered frames reach it without waiting for
+    the next frame and it only waits for the producer when no frame is buffered.
+    The producer waits when the write segment is full, so at most two segments of
+    frames are held.
+
+    :param segment_size: Number of frames in a segment
+    """
+
+    def __init__(self, segment_size: int) -> None:
+        self.segment_size = max(1, segment_size)
+        self._write_segment: List[Union[np.ndarray, cv2.UMat]] = []
+        self._condition = threading.Condition()
+        self._consumer_waiting = False
+        self._closed = False
+        self._stopped = False
+        self.error: Optional[Exception] = None
+
+    def put(self, frame: Union[np.ndarray, cv2.UMat]) -> bool:
+        """
+        Add a frame to the write segment, waiting while the segment is full.
+
+        :param frame: The frame to add
+        :return: False if the consumer stopped reading frames
+        """
+        with self._condition:
+            while len(self._write_segment) >= self.segment_size and not self._stopped:
+                self._condition.wait()
+            if self._stopped:
+                return False
+            self._write_segment.append(frame)
+            if self._consumer_waiting:
+                self._condition.notify_all()
+        return True
+
+    def close(self, error: Optional[Exception] = None) -> None:
+        """
+        Mark the end of the stream after the frames in the write segment.
+
+        :param error: The error that ended the stream, if any
+        """
+        with self._condition:
+            self.error = error
+            self._closed = True
+            self._condition.notify_all()
+
+    def stop(self) -> None:
+        """
+        Signal the producer that the consumer stopped reading frames and drop the
+        frames that were not read.
+        """
+        with self._condition:
+            self._stopped = True
+            self._write_segment = []
+            self._condition.notify_all()
+
+    def get_segment(self) -> Optional[List[Union[np.ndarray, cv2.UMat]]]:
+        """
+        Wait for frames and take every frame buffered so far.
+
+        :return: The frames, or None at the end of the stream
+        """
+        with self._condition:
+            self._consumer_waiting = True
+            while not self._write_segment and not self._closed:
+                self._condition.wait()
+            self._consumer_waiting = False
+            if not self._write_segment:
+                return None
+            segment, self._write_segment = self._write_segment, []
+            self._condition.notify_all()
+        return segment
+
+
+def _process_run(streamer: BaseStreamer, buffer: _PingPongBuffer) -> None:
     """
     Private function that is run by the thread.
 
-    Waits for the buffer to gain space for timeout seconds while it is full.
-    If no space was available within this time the function will exit
+    Places the frames of the streamer in the buffer and closes the buffer at the
+    end of the stream, passing on the error that ended it if any. Stops early if
+    the consumer stopped. The frame iterator is closed on this thread so that the
+    streamer releases its resources before the thread exits.
 
     :param streamer: The streamer to retrieve frames from
     :param buffer: The buffer to place the retrieved frames in
     """
-    for frame in streamer:
-        buffer.put(frame)
+    frames = iter(streamer)
+    error: Optional[Exception] = None
+    try:
+        for frame in frames:
+            if not buffer.put(frame):
+                break
+    except Exception as streamer_error:  # pylint: disable=broad-except
+        error = streamer_error
+    finally:
+        close_frames = getattr(frames, "close", None)
+        if close_frames is not None:
+            close_frames()
+        buffer.close(error)
+
+
+# Seconds to wait for the thread of a ThreadedStreamer to finish the frame it reads
+_THREAD_JOIN_TIMEOUT = 5.0
 
 
 class ThreadedStreamer(BaseStreamer):
     """
     Runs a BaseStreamer on a seperate thread.
 
+    Frames are passed to the consumer by reference through an in-process ping-pong
+    buffer: the thread fills one segment while the consumer reads the other, and the
+    consumer takes all buffered frames at once instead of one frame per wake-up.
+    OpenCV releases the GIL while reading and decoding, so the producer thread runs
+    in parallel with the consumer.
+
+    The buffer size trades latency for throughput: a larger buffer absorbs jitter
+    of the producer and the consumer, so neither has to wait for the other, but
+    frames may spend up to buffer_size frame intervals in the buffer and it holds
+    up to buffer_size frames in memory: a segment of buffer_size // 2 frames that
+    the thread fills and one that the consumer reads. Use a small buffer for live
+    camera input.
+
     :param streamer: The streamer to run on a thread
     :param buffer_size: Number of frame to buffer internally
 
@@ -99,33 +253,39 @@ class ThreadedStreamer(BaseStreamer):
         ...    pass
     """
 
-    def __init__(self, streamer: BaseStreamer, buffer_size: int = 2) -> None:
+    def __init__(self, streamer: BaseStreamer, buffer_size: int = 16) -> None:
         self.buffer_size = buffer_size
         self.streamer = streamer
 
-    def __iter__(self) -> Iterator[np.ndarray]:
-        buffer: multiprocessing.Queue = multiprocessing.Queue(maxsize=self.buffer_size)
-        process = multiprocessing.Process(
-            target=_process_run, args=(self.streamer, buffer)
-        )
+    def __iter__(self) -> Iterator[Union[np.ndarray, cv2.UMat]]:
+        # The thread fills one segment while the consumer reads the other, so the
+        # buffer holds two segments of frames
+        buffer = _PingPongBuffer(max(self.buffer_size // 2, 1))
         # Make thread a daemon so that it will exit when the main program exits as well
-        process.daemon = True
-        process.start()
+        thread = threading.Thread(
+            target=_process_run, args=(self.streamer, buffer), daemon=True
+        )
+        thread.start()
 
         try:
-            while process.is_alive() or not buffer.empty():
-                try:
-                    yield buffer.get(timeout=0.1)
-                except queue.Empty:
-                    pass
-        except GeneratorExit:
-            process.terminate()
+            while True:
+                segment = buffer.get_segment()
+                if segment is None:
+                    break
+                yield from segment
+            if buffer.error is not None:
+                raise buffer.error
         finally:
-            process.join(timeout=0.1)
-            # The kill() function is only available in Python 3.7.
-            # Skip it if running an older Python version.
-            if sys.version_info >= (3, 7) and process.exitcode is None:
-                process.kill()
+            # Wakes up the thread if it waits for the consumer; it stops after the
+            # frame it is reading
+            buffer.stop()
+            thread.join(_THREAD_JOIN_TIMEOUT)
+            if thread.is_alive():
+                logger.warning(
+                    "The streamer thread did not stop within %s seconds and is left "
+                    "running as a daemon",
+                    _THREAD_JOIN_TIMEOUT,
+                )
 
     def get_type(self) -> MediaType:
         """
@@ -134,10 +294,105 @@ class ThreadedStreamer(BaseStreamer):
         return self.streamer.get_type()
 
 
+class _FramePool:
+    """
+    Ring of frame buffers that VideoCapture decodes into.
+
+    The buffers are allocated by the first reads, once the frame size is known, and
+    are reused in a fixed order afterwards. A frame is overwritten pool_size reads
+    later, so the consumer must not keep more than pool_size - 1 frames alive. A
+    ThreadedStreamer reads up to buffer_size frames ahead of the frame being
+    processed, so behind one the pool needs at least buffer_size + 1 buffers.
+    A pool size of 0 disables the pool and every read allocates a new frame.
+
+    :param pool_size: Number of frame buffers in the pool
+    """
+
+    def __init__(self, pool_size: int = 0) -> None:
+        self.pool_size = pool_size
+        self._buffers: List[Optional[np.ndarray]] = [None] * pool_size
+        self._index = 0
+
+    def read(self, capture: cv2.VideoCapture) -> Tuple[bool, np.ndarray]:
+        """
+        Read the next frame of the capture into the next buffer of the pool.
+
+        :param capture: The capture to read from
+        :return: Whether a frame was read and the frame
+        """
+        return self._decode(capture.read)
+
+    def reader(
+        self, capture: cv2.VideoCapture
+    ) -> Callable[[], Tuple[bool, np.ndarray]]:
+        """
+        Get a function that reads the next frame of the capture.
+
+        Without a pool this is capture.read itself, which saves a Python call per
+        frame.
+
+        :param capture: The capture to read from
+        :return: The function that reads a frame
+        """
+        if not self._buffers:
+            return capture.read
+        return functools.partial(self.read, capture)
+
+    def retrieve(self, capture: cv2.VideoCapture) -> Tuple[bool, np.ndarray]:
+        """
+        Decode the frame grabbed last by the capture into the next buffer of the pool.
+
+        :param capture: The capture to retrieve the frame from
+        :return: Whether a frame was retrieved and the frame
+        """
+        return self._decode(capture.retrieve)
+
+    def _decode(
+        self, decode: Callable[..., Tuple[bool, np.ndarray]]
+    ) -> Tuple[bool, np.ndarray]:
+        if not self._buffers:
+            return decode()
+        status, frame = decode(self._buffers[self._index])
+        if status:
+            self._buffers[self._index] = frame
+            self._index = (self._index + 1) % self.pool_size
+        return status, frame
+
+
+def _to_rgb(frame: np.ndarray, use_umat: bool = False) -> Union[np.ndarray, cv2.UMat]:
+    """
+    Convert a BGR or BGRA frame to RGB or RGBA.
+
+    Single channel frames, e.g. from grayscale or infrared cameras, have no channel
+    order and are returned without conversion.
+
+    :param frame: The frame, converted in place unless use_umat is set
+    :param use_umat: Move the frame to a cv2.UMat and convert it with the T-API
+    :return: The converted frame, a cv2.UMat if use_umat is set
+    """
+    channels = 1 if frame.ndim == 2 else frame.shape[2]
+    if channels == 1:
+        return cv2.UMat(frame) if use_umat else frame  # type: ignore[call-overload]
+    code = cv2.COLOR_BGRA2RGBA if channels == 4 else cv2.COLOR_BGR2RGB
+    if use_umat:
+        return cv2.cvtColor(cv2.UMat(frame), code)  # type: ignore[call-overload]
+    return cv2.cvtColor(frame, code, dst=frame)
+
+
 class VideoStreamer(BaseStreamer):
     """
     Video Streamer
+
+    Videos are opened with the FFmpeg backend and hardware accelerated decoding
+    (VA-API, D3D11, NVDEC, ...) if OpenCV supports it on the system. Otherwise the
+    default backend decodes on the CPU. A GStreamer pipeline can be passed as the
+    path as well, e.g. one ending in a hardware decoder and appsink.
+
     :param path: Path to the video file.
+    :param pool_size: Number of reused frame buffers, 0 to allocate every frame. Use
+        at least buffer_size + 1 behind a ThreadedStreamer
+    :param hw_acceleration: Try hardware accelerated decoding first
+    :param use_umat: Return the frames as cv2.UMat
 
     :example:
 
@@ -146,33 +401,70 @@ class VideoStreamer(BaseStreamer):
         ...    pass
     """
 
-    def __init__(self, input_path: str, loop: bool = False) -> None:
+    def __init__(
+        self,
+        input_path: str,
+        loop: bool = False,
+        pool_size: int = 0,
+        hw_acceleration: bool = True,
+        use_umat: bool = False,
+    ) -> None:
+        _log_opencv_build()
         self.media_type = MediaType.VIDEO
         self.loop = loop
+        self.use_umat = use_umat
+        self.frame_pool = _FramePool(pool_size)
         self.cap = cv2.VideoCapture()
-        status = self.cap.open(input_path)
+        status = hw_acceleration and self.cap.open(
+            input_path,
+            cv2.CAP_FFMPEG,
+            [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY],
+        )
+        if status:
+            logger.debug(
+                "Video %s is decoded with hardware acceleration %d",
+                input_path,
+                self.cap.get(cv2.CAP_PROP_HW_ACCELERATION),
+            )
+        else:
+            status = self.cap.open(input_path)
         if not status:
             raise InvalidInput(f"Can't open the video from {input_path}")
 
-    def __iter__(self) -> Iterator[np.ndarray]:
+    def __iter__(self) -> Iterator[Union[np.ndarray, cv2.UMat]]:
+        # Local names keep attribute lookups out of the per-frame loop
+        read, use_umat = self.frame_pool.reader(self.cap), self.use_umat
         while True:
-            status, image = self.cap.read()
+            status, image = read()
             if status:
-                yield cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+                yield _to_rgb(image, use_umat)
+            elif self.loop:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
             else:
-                if self.loop:
-                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                else:
-                    break
+                break
 
     def get_type(self) -> MediaType:
         return MediaType.VIDEO
 
 
+# Upper bound of the queued frames CameraStreamer skips to reach the latest one
+_MAX_STALE_FRAMES = 30
+
+
 class CameraStreamer(BaseStreamer):
     """
     Stream video frames from camera
     :param camera_device: Camera device index e.g, 0, 1
+    :param drop_stale: Return the latest frame of the camera instead of the oldest
+        queued one, so a slow consumer does not fall behind. Queued frames are
+        grabbed without being decoded; a grab that waits for the camera marks the
+        latest frame, which is then decoded. A grab can't tell in advance that it
+        will wait, so the last queued frame is dropped too and every returned frame
+        waits up to one frame interval for the camera. This trades throughput for
+        latency: a consumer that takes 50 ms per frame gets about 15 instead of 20
+        frames per second from a 30 fps camera, but every frame is fresh.
+    :param pool_size: Number of reused frame buffers, 0 to allocate every frame
+    :param use_umat: Return the frames as cv2.UMat
 
     :example:
 
@@ -183,27 +475,66 @@ class CameraStreamer(BaseStreamer):
         ...         break
     """
 
-    def __init__(self, camera_device: int = 0) -> None:
+    def __init__(
+        self,
+        camera_device: int = 0,
+        drop_stale: bool = False,
+        pool_size: int = 0,
+        use_umat: bool = False,
+    ) -> None:
+        _log_opencv_build()
         self.media_type = MediaType.CAMERA
+        self.drop_stale = drop_stale
+        self.use_umat = use_umat
+        self.frame_pool = _FramePool(pool_size)
         try:
             self.stream = cv2.VideoCapture(int(camera_device))
         except ValueError as error:
             raise InvalidInput(f"Can't find the camera {camera_device}") from error
+        if drop_stale:
+            # Backends that support it keep a single frame queued
+            self.stream.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            fps = self.stream.get(cv2.CAP_PROP_FPS)
+            # A grab that takes longer than half a frame interval waited for the camera
+            self._fresh_grab_time = 0.5 / fps if fps > 0 else 0.005
+
+    def _grab_latest(self) -> bool:
+        """
+        Grab the queued frames without decoding them until a grab waits for the camera.
+
+        The frame grabbed by that grab is newer than every queued frame, but waiting
+        for it costs up to one frame interval.
+
+        :return: Whether a frame was grabbed
+        """
+        for _ in range(_MAX_STALE_FRAMES):
+            grab_start = time.perf_counter()
+            if not self.stream.grab():
+                return False
+            if time.perf_counter() - grab_start >= self._fresh_grab_time:
+                break
+        return True
 
-    def __iter__(self) -> Iterator[np.ndarray]:
+    def __iter__(self) -> Iterator[Union[np.ndarray, cv2.UMat]]:
         """
         Read video and yield the frame.
         :param stream: Video stream captured via OpenCV's VideoCapture
         :return: Individual frame
         """
-        while True:
-            frame_available, frame = self.stream.read()
-            if not frame_available:
-                break
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            yield frame
-
-        self.stream.release()
+        read, use_umat = self.frame_pool.reader(self.stream), self.use_umat
+        try:
+            while True:
+                if self.drop_stale:
+                    if not self._grab_latest():
+                        break
+                    frame_available, frame = self.frame_pool.retrieve(self.stream)
+                else:
+                    frame_available, frame = read()
+                if not frame_available:
+                    break
+                yield _to_rgb(frame, use_umat)
+        finally:
+            self.stream.release()
 
     def get_type(self) -> MediaType:
         return MediaType.CAMERA
@@ -213,6 +544,7 @@ class ImageStreamer(BaseStreamer):
     """
     Stream from image file.
     :param path: Path to an image.
+    :param use_umat: Return the frames as cv2.UMat
 
     :example:
 
@@ -222,22 +554,25 @@ class ImageStreamer(BaseStreamer):
         ...     cv2.waitKey(0)
     """
 
-    def __init__(self, input_path: str, loop: bool = False) -> None:
+    def __init__(
+        self, input_path: str, loop: bool = False, use_umat: bool = False
+    ) -> None:
+        _log_opencv_build()
         self.loop = loop
         self.media_type = MediaType.IMAGE
         if not os.path.isfile(input_path):
             raise InvalidInput(f"Can't find the image by {input_path}")
-        self.image = cv2.imread(input_path, cv2.IMREAD_COLOR)
-        if self.image is None:
+        image = read_rgb_image(input_path)
+        if image is None:
             raise OpenError(f"Can't open the image from {input_path}")
-        self.image = cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
+        self.image: Union[np.ndarray, cv2.UMat] = (
+            cv2.UMat(image) if use_umat else image  # type: ignore[call-overload]
+        )
 
-    def __iter__(self) -> Iterator[np.ndarray]:
+    def __iter__(self) -> Iterator[Union[np.ndarray, cv2.UMat]]:
         if not self.loop:
-            yield self.image
-        else:
-            while True:
-                yield self.image
+            return iter((self.image,))
+        return itertools.repeat(self.image)
 
     def get_type(self) -> MediaType:
         return MediaType.IMAGE
@@ -246,7 +581,16 @@ class ImageStreamer(BaseStreamer):
 class DirStreamer(BaseStreamer):
     """
     Stream from directory of images.
+
+    The files with an image extension are read in alphabetical order.
+
+    The next images are read and decoded on thread pools ahead of demand, in two
+    stages: one pool reads the files into memory and the other decodes them, so
+    disk or network I/O, decoding and the processing of the current frame overlap.
+
     :param path: Path to directory.
+    :param prefetch_size: Number of images to decode ahead of the consumer
+    :param use_umat: Return the frames as cv2.UMat
 
     :example:
 
@@ -256,33 +600,95 @@ class DirStreamer(BaseStreamer):
         ...     cv2.waitKey(0)
     """
 
-    def __init__(self, input_path: str, loop: bool = False) -> None:
+    def __init__(
+        self,
+        input_path: str,
+        loop: bool = False,
+        prefetch_size: int = 8,
+        use_umat: bool = False,
+    ) -> None:
+        _log_opencv_build()
         self.loop = loop
+        self.use_umat = use_umat
         self.media_type = MediaType.DIR
-        self.dir = input_path
-        if not os.path.isdir(self.dir):
+        self.prefetch_size = max(1, prefetch_size)
+        if not os.path.isdir(input_path):
             raise InvalidInput(f"Can't find the dir by {input_path}")
-        self.names = sorted(os.listdir(self.dir))
-        if not self.names:
-            raise OpenError(f"The dir {input_path} is empty")
+        with os.scandir(input_path) as entries:
+            self.paths = sorted(
+                entry.path
+                for entry in entries
+                if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file()
+            )
+        if not self.paths:
+            raise OpenError(f"The dir {input_path} has no images")
+        self._decoders = [get_image_decoder(path) for path in self.paths]
         self.file_id = 0
-        for name in self.names:
-            filename = os.path.join(self.dir, name)
-            image = cv2.imread(str(filename), cv2.IMREAD_COLOR)
-            if image is not None:
+        # Only check the file signatures, decoding is left to the iteration
+        for path in self.paths:
+            if cv2.haveImageReader(path):
                 return
         raise OpenError(f"Can't read the first image from {input_path}")
 
-    def __iter__(self) -> Iterator[np.ndarray]:
-        while self.file_id < len(self.names):
-            filename = os.path.join(self.dir, self.names[self.file_id])
-            image = cv2.imread(str(filename), cv2.IMREAD_COLOR)
-            if self.file_id < len(self.names) - 1:
-                self.file_id = self.file_id + 1
-            else:
-                self.file_id = self.file_id + 1 if not self.loop else 0
-            if image is not None:
-                yield cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    def __iter__(self) -> Iterator[Union[np.ndarray, cv2.UMat]]:
+        max_workers = min(8, os.cpu_count() or 1, self.prefetch_size)
+        with ThreadPoolExecutor(max_workers=max_workers) as read_executor:
+            with ThreadPoolExecutor(max_workers=max_workers) as decode_executor:
+                yield from self._read_ahead(read_executor, decode_executor)
+
+    # pylint: disable=too-many-locals
+    def _read_ahead(
+        self, read_executor: Executor, decode_executor: Executor
+    ) -> Iterator[Union[np.ndarray, cv2.UMat]]:
+        """
+        Read and decode the next images ahead of demand and yield them in order.
+
+        :param read_executor: The executor that reads the files
+        :param decode_executor: The executor that decodes the read files
+        """
+        paths, decoders = self.paths, self._decoders
+        num_files = len(paths)
+        prefetch_size, loop, use_umat = self.prefetch_size, self.loop, self.use_umat
+        # Files being read ahead of the decoding, and images being decoded, with the
+        # file_id that follows them. self.file_id only advances past an image when it
+        # is yielded, so iterating again resumes after the last image returned.
+        reads: Deque[Tuple[int, Callable, Future]] = deque()
+        decodes: Deque[Tuple[int, Future]] = deque()
+        next_id = self.file_id
+        # The file signatures were checked in the constructor, but files can still
+        # fail to decode; without this count a looping stream of them never ends
+        failed_images = 0
+        try:
+            while True:
+                while len(reads) < prefetch_size and next_id < num_files:
+                    data = read_executor.submit(read_file, paths[next_id])
+                    decoder = decoders[next_id]
+                    next_id = (next_id + 1) % num_files if loop else next_id + 1
+                    reads.append((next_id, decoder, data))
+                while len(decodes) < prefetch_size and reads:
+                    file_id, decoder, data = reads.popleft()
+                    decodes.append(
+                        (file_id, decode_executor.submit(decode_file, decoder, data))
+                    )
+                if not decodes:
+                    break
+                file_id, decode = decodes.popleft()
+                image = decode.result()
+                self.file_id = file_id
+                if image is None:
+                    failed_images += 1
+                    if failed_images >= num_files:
+                        raise OpenError(
+                            f"Can't read any image from {os.path.dirname(paths[0])}"
+                        )
+                    continue
+                failed_images = 0
+                yield cv2.UMat(image) if use_umat else image
+        finally:
+            for _, _, data in reads:
+                data.cancel()
+            for _, decode in decodes:
+                decode.cancel()
 
     def get_type(self) -> MediaType:
         return MediaType.DIR